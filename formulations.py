@@ -1,10 +1,27 @@
 import cplex
 import networkx as nx
-import numpy as np
+import math
+import numbers
 import time
 import datetime
+import hashlib
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
 from solution import Solution
 
+# Non-default CPLEX parameters that are applied to every formulation, given as a mapping from the dotted parameter path
+# (relative to `cplex.Cplex().parameters`) to its value. More aggressive cut generation reduces the number of
+# branch-and-bound nodes for the capacity (big-M like) linking constraints and the N_max cardinality constraints.
+DEFAULT_CPLEX_PARAMS = {'mip.cuts.disjunctive': 3,
+                        'mip.cuts.liftproj': 3,
+                        'mip.cuts.localimplied': 3,
+                        'mip.cuts.cliques': 3,
+                        'mip.cuts.covers': 3,
+                        'mip.cuts.gomory': 2,
+                        'emphasis.mip': 2,
+                        }
+
 
 class Formulation:
     """
@@ -37,40 +54,70 @@ class Formulation:
     read_from_file : bool, optional
         Whether the formulation should be constructed from scratch or read from a file. Can be used if constructing
         the program takes a long time and one wants to generate results on this same graph (e.g. the Colt data set).
+    cplex_params : dict, optional
+        CPLEX parameters to set, given as a mapping from the dotted parameter path (e.g. 'mip.cuts.gomory') to its
+        value. These are applied on top of (and can override) `DEFAULT_CPLEX_PARAMS`, `threads` and `time_limit`. Use
+        this to change for instance the relative MIP gap ('mip.tolerances.mipgap') or to turn off presolve
+        ('preprocessing.presolve').
+    threads : int, optional
+        Maximum number of threads that CPLEX may use. By default CPLEX decides this itself.
+    time_limit : float, optional
+        Time limit in seconds for solving the formulation. If it is reached, the best solution found so far is used.
+    stall_time : float, optional
+        Time in seconds after which solving is stopped if the best solution found so far has not improved, in which
+        case this solution is used. Useful for parameter sweeps where a near-optimal solution suffices, since proving
+        optimality can take much longer than finding the optimal solution.
+    num_workers : int, optional
+        Number of processes with which the variables of the different source-destination pairs are generated in
+        parallel. The default of 1 generates them sequentially in the current process. Only used by the path-based
+        formulation, since the link-based formulation only has to look up its elementary links in the shortest paths
+        that are computed once for all pairs, which is cheaper than sending them between processes.
+    cache_dir : str, optional
+        Directory in which constructed formulations are stored. If a formulation of the same type was constructed
+        before for the same graph and parameters, it is read from this directory instead of being constructed again.
+        Note that the cache is not invalidated when the construction code changes.
     """
 
-    def __init__(self, graph_container, N_max: int, L_max: float, D: int, K: int, alpha=0., read_from_file=False):
+    def __init__(self, graph_container, N_max: int, L_max: float, D: int, K: int, alpha=0., read_from_file=False,
+                 cplex_params=None, threads=None, time_limit=None, stall_time=None, num_workers=1, cache_dir=None):
         self.graph_container = graph_container
-        if N_max < 1:
-            raise ValueError("N_max must be a non-negative integer.")
-        elif N_max > self.graph_container.num_repeater_nodes:
-            print("Value of N_max exceeds the total number of repeaters {}. Manually set to {}.".format(
-                self.graph_container.num_repeater_nodes, self.graph_container.num_repeater_nodes))
-            N_max = self.graph_container.num_repeater_nodes
-        self.N_max = N_max
-        self._check_if_feasible(L_max)
-        self.L_max = L_max
-        if D < 0:
-            raise ValueError("D must be a positive integer.")
-        elif D > self.graph_container.num_unique_pairs:
-            print("Value of D exceeds the total number of source-destination pairs {}. Manually set to {}".format(
-                self.graph_container.num_unique_pairs, self.graph_container.num_unique_pairs))
-            D = self.graph_container.num_unique_pairs
-        self.D = D
-        if K < 1 or K > self.graph_container.num_repeater_nodes + 1:
-            raise ValueError("K must be a positive integer that cannot exceed the total number of repeaters plus one.")
-        self.K = K
-        if alpha < 0:
-            raise ValueError("alpha must be a non-negative float")
-        self.alpha = alpha
+        if num_workers < 1:
+            raise ValueError("num_workers must be a positive integer.")
+        self.num_workers = num_workers
+        self.N_max = self._validate_parameter('N_max', N_max)
+        self.L_max = self._validate_parameter('L_max', L_max)
+        self.D = self._validate_parameter('D', D)
+        self.K = self._validate_parameter('K', K)
+        self.alpha = self._validate_parameter('alpha', alpha)
+        self.stall_time = self._validate_parameter('stall_time', stall_time)
         self.read_from_file = read_from_file
         # Variable map for linking an abstract CPLEX variable to an actual path or elementary link
         self.varmap = {}
+        # Index of the variable that connects a source-destination pair directly (without repeaters), used to construct
+        # a MIP start
+        self.direct_link_vars = {}
+        # Index of every constraint, given by a key of the form (constraint type, pair, node, k). The constraints are
+        # not named in CPLEX, such that the variables can refer to them by index directly.
+        self.constraint_indices = {}
         # Create new CPLEX problem and set the mip tolerance
         self.cplex = cplex.Cplex()
         # Default value is 1e-4, but in `graph_tools._compute_dist_cartesian' the costs are rounded to 5 decimals, so
         # set tolerance to 1e-6.
         self.cplex.parameters.mip.tolerances.mipgap.set(1e-6)
+        # The columns of both formulations have non-zeros in many constraints, for which the primal simplex method
+        # tends to outperform the default dual simplex method. Use it for the root LP and for the node LPs.
+        self.cplex.parameters.lpmethod.set(self.cplex.parameters.lpmethod.values.primal)
+        self.cplex.parameters.mip.strategy.startalgorithm.set(
+            self.cplex.parameters.mip.strategy.startalgorithm.values.primal)
+        self.cplex.parameters.mip.strategy.subalgorithm.set(
+            self.cplex.parameters.mip.strategy.subalgorithm.values.primal)
+        solver_params = dict(DEFAULT_CPLEX_PARAMS)
+        if threads is not None:
+            solver_params['threads'] = threads
+        if time_limit is not None:
+            solver_params['timelimit'] = time_limit
+        solver_params.update(cplex_params or {})
+        self._set_cplex_params(solver_params)
         # Suppress output of CPLEX (comment to receive output statistics)
         self.cplex.set_log_stream(None)
         # self.prob.set_error_stream(None)
@@ -80,30 +127,112 @@ class Formulation:
             # Read from file (use this when ILP takes very long to construct)
             self.cplex.read("colt_with_QIA_cities.lp")
         else:
-            # Set objective sense to minimization
-            self.cplex.objective.set_sense(self.cplex.objective.sense.minimize)
-            # Time and add constraints and variables
-            start_time = time.time()
-            self._add_constraints()
-            self._add_variables()
-            comp_time = datetime.timedelta(seconds=time.time() - start_time)
-            # print("Constructing program takes: {} s".format(comp_time))
-            # print('Total number of variables: {} (expected at most {} variables)'
-            #       .format(self.prob.variables.get_num(), self._compute_expected_number_of_variables()))
-            # # Write linear program to text file for debugging purposes
-            # self.prob.write("test_form.lp")
+            if cache_dir is None or not self._read_from_cache(cache_dir):
+                # Set objective sense to minimization
+                self.cplex.objective.set_sense(self.cplex.objective.sense.minimize)
+                # Time and add constraints and variables
+                start_time = time.time()
+                self._add_constraints()
+                self._add_variables()
+                comp_time = datetime.timedelta(seconds=time.time() - start_time)
+                # print("Constructing program takes: {} s".format(comp_time))
+                # print('Total number of variables: {} (expected at most {} variables)'
+                #       .format(self.prob.variables.get_num(), self._compute_expected_number_of_variables()))
+                # # Write linear program to text file for debugging purposes
+                # self.prob.write("test_form.lp")
+                if cache_dir is not None:
+                    self._write_to_cache(cache_dir)
+
+    def _cache_path(self, cache_dir):
+        """Return the path (without extension) under which this formulation is cached in `cache_dir`. It is determined
+        by a hash of the formulation type, the graph including its edge lengths and the parameters."""
+        graph = self.graph_container.graph
+        key = (type(self).__name__, sorted(graph.nodes()), self.graph_container.end_nodes,
+               sorted((min(u, v), max(u, v), length) for u, v, length in graph.edges(data='length')),
+               self.N_max, self.L_max, self.D, self.K, self.alpha)
+        return os.path.join(cache_dir, hashlib.sha1(repr(key).encode()).hexdigest())
+
+    def _read_from_cache(self, cache_dir):
+        """Read the CPLEX problem, the variable map and the constraint indices from `cache_dir`, if they exist. Returns
+        whether this succeeded. The problem is stored in the SAV format, which (unlike the LP format) preserves the
+        order of the variables and constraints that the variable map and constraint indices refer to."""
+        path = self._cache_path(cache_dir)
+        if not (os.path.isfile(path + '.sav') and os.path.isfile(path + '.pkl')):
+            return False
+        self.cplex.read(path + '.sav')
+        with open(path + '.pkl', 'rb') as file:
+            self.varmap, self.direct_link_vars, self.constraint_indices = pickle.load(file)
+        return True
+
+    def _write_to_cache(self, cache_dir):
+        """Write the CPLEX problem, the variable map and the constraint indices to `cache_dir`."""
+        os.makedirs(cache_dir, exist_ok=True)
+        path = self._cache_path(cache_dir)
+        self.cplex.write(path + '.sav')
+        with open(path + '.pkl', 'wb') as file:
+            pickle.dump((self.varmap, self.direct_link_vars, self.constraint_indices), file)
+
+    def __getstate__(self):
+        """Leave out the CPLEX object when pickling, such that the formulation can be sent to worker processes."""
+        state = self.__dict__.copy()
+        del state['cplex']
+        return state
+
+    def __setstate__(self, state):
+        """Restore a pickled formulation, which gets an ended CPLEX object like a formulation on which `clear` was
+        called, since the CPLEX problem itself is not pickled."""
+        self.__dict__.update(state)
+        self.cplex = cplex.Cplex()
+        self.cplex.end()
+
+    def _set_cplex_params(self, cplex_params):
+        """Set CPLEX parameters given as a mapping from the dotted parameter path to its value."""
+        for path, value in cplex_params.items():
+            parameter = self.cplex.parameters
+            for attribute in path.split('.'):
+                parameter = getattr(parameter, attribute)
+            parameter.set(value)
+
+    def _validate_parameter(self, name, value):
+        """Check the value of parameter `name` (N_max, L_max, D, K, alpha or stall_time) and return it, where N_max and
+        D are capped at their upper bounds."""
+        if name == 'N_max':
+            if value < 1:
+                raise ValueError("N_max must be a non-negative integer.")
+            elif value > self.graph_container.num_repeater_nodes:
+                print("Value of N_max exceeds the total number of repeaters {}. Manually set to {}.".format(
+                    self.graph_container.num_repeater_nodes, self.graph_container.num_repeater_nodes))
+                value = self.graph_container.num_repeater_nodes
+        elif name == 'L_max':
+            self._check_if_feasible(value)
+        elif name == 'D':
+            if value < 0:
+                raise ValueError("D must be a positive integer.")
+            elif value > self.graph_container.num_unique_pairs:
+                print("Value of D exceeds the total number of source-destination pairs {}. Manually set to {}".format(
+                    self.graph_container.num_unique_pairs, self.graph_container.num_unique_pairs))
+                value = self.graph_container.num_unique_pairs
+        elif name == 'K':
+            if value < 1 or value > self.graph_container.num_repeater_nodes + 1:
+                raise ValueError("K must be a positive integer that cannot exceed the total number of repeaters plus "
+                                 "one.")
+        elif name == 'alpha':
+            if value < 0:
+                raise ValueError("alpha must be a non-negative float")
+        elif name == 'stall_time':
+            if value is not None and (isinstance(value, bool) or not isinstance(value, numbers.Real) or value <= 0):
+                raise ValueError("stall_time must be a positive float or None.")
+        else:
+            raise ValueError("Unknown parameter {}.".format(name))
+        return value
 
     def _check_if_feasible(self, L_max):
         """Check whether a feasible solution can exist with the provided value of L_max."""
         if L_max < 0:
             raise ValueError("L_max must be a positive float.")
         for end_node in self.graph_container.end_nodes:
-            for edge in self.graph_container.graph.edges(end_node):
-                edge_length = self.graph_container.graph[edge[0]][edge[1]]['length']
-                if edge_length <= L_max:
-                    # There is at least one edge that can be used to 'leave' this node
-                    break
-            else:
+            # There must be at least one edge that can be used to 'leave' this node
+            if self.graph_container.min_edge_length[end_node] > L_max:
                 raise ValueError("No feasible solution exists! There are no edges leaving {} with length smaller than "
                                  "or equal to {}".format(end_node, L_max))
 
@@ -119,65 +248,175 @@ class Formulation:
         """Base attribute for adding variables to the formulations. Should be overwritten."""
         pass
 
+    def _build_warmstart(self):
+        """Add a MIP start in which every source-destination pair uses the variable that connects it directly along its
+        shortest path, which uses no repeaters at all. This is only a feasible solution if K = 1 and every pair can be
+        connected directly within L_max. Otherwise CPLEX would have to complete it with other (disjoint) paths, which
+        is not always possible within the limits on N_max and D, and it warns when it finds no solution from the
+        start. The start is therefore only added if it is a feasible solution by itself."""
+        if self.K != 1 or len(self.direct_link_vars) < self.graph_container.num_unique_pairs or \
+                self.cplex.MIP_starts.get_num() > 0:
+            return
+        x_indices = list(self.direct_link_vars.values())
+        # The direct connections are forbidden if L_max was lowered below their length, see `update_parameters`
+        if min(self.cplex.variables.get_upper_bounds(x_indices)) < 1.:
+            return
+        self.cplex.MIP_starts.add(cplex.SparsePair(ind=x_indices, val=[1.0] * len(x_indices)),
+                                  self.cplex.MIP_starts.effort_level.check_feasibility, "greedy")
+
+    def add_warmstart(self, solution):
+        """Add a MIP start that uses the same repeater nodes as a solution of another formulation of the same graph,
+        for instance one with different parameters or of the other formulation type. Only the repeater variables are
+        given, the corresponding paths are found by CPLEX when solving. Note that within the same formulation (see
+        `update_parameters`) the previous solution is already kept by CPLEX as a MIP start.
+
+        Parameters
+        ----------
+        solution : Solution
+            Previously found solution. Nothing is added if it is not feasible.
+        """
+        if not solution.feasible:
+            return
+        # Add the start of `_build_warmstart` first, which is only added if there are no MIP starts yet
+        self._build_warmstart()
+        chosen_nodes = set(solution.repeater_nodes_chosen)
+        rep_nodes = self.graph_container.possible_rep_nodes
+        self.cplex.MIP_starts.add(cplex.SparsePair(ind=['y_' + u for u in rep_nodes],
+                                                   val=[1.0 if u in chosen_nodes else 0. for u in rep_nodes]),
+                                  self.cplex.MIP_starts.effort_level.solve_MIP)
+
     def solve(self):
         """Solve the formulation and return the Solution object as well as the computation time."""
+        self._build_warmstart()
+        if self.stall_time is not None:
+            # Stop as soon as the best solution found so far has not improved for `stall_time` seconds
+            self.cplex.set_callback(_StallAborter(self.stall_time), cplex.callbacks.Context.id.global_progress)
         starttime = self.cplex.get_time()
         self.cplex.solve()
         comp_time = self.cplex.get_time() - starttime
         sol = Solution(self)
         return sol, comp_time
 
+    def update_parameters(self, N_max=None, L_max=None, D=None, K=None, alpha=None):
+        """Change parameters of the formulation in place, which is much faster than constructing a new formulation
+        when solving the same graph for a range of parameter values. Only parameters that do not change the structure
+        of the formulation can be changed, see `_check_parameter_update` of the subclasses. The previous solution (if
+        any) is kept by CPLEX as a MIP start for the next call of `solve`, unless a parameter is made more restrictive
+        (or K is changed), since the previous solution may then no longer be feasible.
+
+        Parameters
+        ----------
+        N_max, L_max, D, K, alpha : optional
+            New values of the parameters, see `Formulation`. Parameters that are not given are left unchanged.
+        """
+        new_values = {'N_max': N_max, 'L_max': L_max, 'D': D, 'K': K, 'alpha': alpha}
+        # Check all new values before changing anything
+        new_values = {name: self._validate_parameter(name, value) for name, value in new_values.items()
+                      if value is not None}
+        for name, value in new_values.items():
+            self._check_parameter_update(name, value)
+        if any(name == 'K' and value != self.K or name in ('N_max', 'L_max', 'D') and value < getattr(self, name)
+               for name, value in new_values.items()):
+            # CPLEX would only warn that it found no solution from MIP starts that are no longer feasible
+            self.cplex.MIP_starts.delete()
+        for name, value in new_values.items():
+            self._update_parameter(name, value)
+            setattr(self, name, value)
+
+    def _check_parameter_update(self, name, value):
+        """Check whether parameter `name` can be changed to `value` in place, see `update_parameters`. Both
+        formulations can change D and alpha, subclasses extend this with the parameters that they can change."""
+        if name not in ('D', 'alpha'):
+            raise ValueError("{} of the {} cannot be changed in place, construct a new formulation instead."
+                             .format(name, type(self).__name__))
+
+    def _update_parameter(self, name, value):
+        """Change parameter `name` to `value` in the CPLEX problem, see `update_parameters`."""
+        if name == 'D':
+            # Coefficient of the repeater variables in the linking constraints
+            self.cplex.linear_constraints.set_coefficients(
+                [(self.constraint_indices[self._link_con_type, u], 'y_' + u, -value)
+                 for u in self.graph_container.possible_rep_nodes])
+        elif name == 'alpha':
+            # The last entry of every tuple in the variable map is the cost of the path or elementary link
+            self.cplex.objective.set_linear([(index, value * tup[-1]) for index, tup in self.varmap.items()])
+
     def clear(self):
         """Clear the reference to the CPLEX object to free up memory when creating multiple formulations."""
         self.cplex.end()
         self.varmap = {}
+        self.direct_link_vars = {}
+        self.constraint_indices = {}
 
 
 class LinkBasedFormulation(Formulation):
     """Subclass for the link-based formulation."""
-    def __init__(self, graph_container, N_max, L_max, K, D, alpha, read_from_file=False):
+    # Type of the constraints that link the x and y variables, see `_update_parameter`
+    _link_con_type = 'LinkXYCon'
+
+    def __init__(self, graph_container, N_max, L_max, K, D, alpha, read_from_file=False, cplex_params=None,
+                 threads=None, time_limit=None, stall_time=None, num_workers=1, cache_dir=None):
         super().__init__(graph_container=graph_container, N_max=N_max, L_max=L_max, D=D, K=K, alpha=alpha,
-                         read_from_file=read_from_file)
+                         read_from_file=read_from_file, cplex_params=cplex_params, threads=threads,
+                         time_limit=time_limit, stall_time=stall_time, num_workers=num_workers, cache_dir=cache_dir)
+        # Elementary links are only generated up to this length, so L_max can only be lowered in place
+        self.constructed_L_max = self.L_max
 
     def _compute_expected_number_of_variables(self):
         num_vars = (self.graph_container.num_repeater_nodes * (self.graph_container.num_repeater_nodes + 1) + 1) \
                    * len(self.graph_container.unique_end_node_pairs) * self.K + self.graph_container.num_repeater_nodes
         return int(num_vars)
 
+    def _check_parameter_update(self, name, value):
+        if name == 'L_max':
+            if value > self.constructed_L_max:
+                raise ValueError("L_max can only be increased up to the value {} with which the formulation was "
+                                 "constructed.".format(self.constructed_L_max))
+        elif name != 'N_max':
+            super()._check_parameter_update(name, value)
+
+    def _update_parameter(self, name, value):
+        if name == 'N_max':
+            # Right-hand side of the constraints on the maximum number of repeaters
+            self.cplex.linear_constraints.set_rhs([(index, float(value))
+                                                   for key, index in self.constraint_indices.items()
+                                                   if key[0] == 'MaxRepCon'])
+        elif name == 'L_max':
+            # Forbid the elementary links that are longer than the new L_max, where the last entry of every tuple in
+            # the variable map is the length of the elementary link
+            self.cplex.variables.set_upper_bounds([(index, 1.0 if tup[-1] <= value else 0.)
+                                                   for index, tup in self.varmap.items()])
+        else:
+            super()._update_parameter(name, value)
+
     def _add_constraints(self):
         """Add all the constraints of the link-based formulation. Note that the constraint that uses L_max is
         incorporated in `self._add_variables`. TODO: add paper reference to constraint."""
         # Use some local references for shorter notation
         prob = self.cplex
         rep_nodes = self.graph_container.possible_rep_nodes
-        num_repeater_nodes = self.graph_container.num_repeater_nodes
+        # Collect all constraints as (key, sense, rhs) and add them to CPLEX in a single call
         # Constraints for linking the x and y variables
-        link_xy_con_names = ['LinkXYCon_' + s for s in rep_nodes]
-        prob.linear_constraints.add(rhs=[0] * num_repeater_nodes, senses=['L'] * num_repeater_nodes,
-                                    names=link_xy_con_names)
+        constraints = [(('LinkXYCon', s), 'L', 0.) for s in rep_nodes]
         # Add constraints per unique pair and for every value of K
         for q in self.graph_container.unique_end_node_pairs:
-            pairname = "(" + q[0] + "," + q[1] + ")"
             # Constraint that enforces that the path from s to t can be used at most once
-            prob.linear_constraints.add(rhs=[1], senses=['L'], names=['STCon' + pairname])
-            # Constraint for generating K node-disjoint paths (note that this has no effect for K = 1)
-            disjoint_con_names = []
-            for u in rep_nodes + [q[0]]:
-                disjoint_con_names.append('DisLinkCon' + pairname + '_' + u)
-            num_cons = len(disjoint_con_names)
-            prob.linear_constraints.add(rhs=[1] * num_cons, senses=['L'] * num_cons, names=disjoint_con_names)
+            constraints.append((('STCon', q), 'L', 1.))
+            # Constraint for generating K node-disjoint paths (note that this has no effect for K = 1). No elementary
+            # link ends in the source, so it only needs these constraints for the repeater nodes.
+            constraints.extend((('DisLinkCon', q, u), 'L', 1.) for u in rep_nodes)
             for k in range(1, self.K + 1):
                 # Each source should have exactly one outgoing arc
-                prob.linear_constraints.add(rhs=[1], senses=['E'], names=['SourceCon' + pairname + '#' + str(k)])
-                flow_cons_names = ['FlowCon' + pairname + "_" + s + '#' + str(k) for s in rep_nodes]
+                constraints.append((('SourceCon', q, k), 'E', 1.))
                 # Each regular node should have equal inflow and outflow
-                prob.linear_constraints.add(rhs=[0] * num_repeater_nodes, senses=['E'] * num_repeater_nodes,
-                                            names=flow_cons_names)
+                constraints.extend((('FlowCon', q, s, k), 'E', 0.) for s in rep_nodes)
                 # Each sink should have exactly one ingoing arc
-                prob.linear_constraints.add(rhs=[-1], senses=['E'], names=['SinkCon' + pairname + '#' + str(k)])
+                constraints.append((('SinkCon', q, k), 'E', -1.))
                 # Constraint for maximum number of repeaters per (s,t) pair
-                prob.linear_constraints.add(rhs=[self.N_max], senses=['L'], names=['MaxRepCon' + pairname + '#' +
-                                                                                   str(k)])
+                constraints.append((('MaxRepCon', q, k), 'L', float(self.N_max)))
+        keys, senses, rhs = zip(*constraints)
+        indices = prob.linear_constraints.add(rhs=list(rhs), senses=''.join(senses))
+        self.constraint_indices.update(zip(keys, indices))
 
     def _add_variables(self):
         """Generate all the variables of the link-based formulation, add them to the correct corresponding constraints
@@ -189,86 +428,138 @@ class LinkBasedFormulation(Formulation):
         # we actually implement sum_{q in Q} sum_{v: (u, v) in E_q} sum_{K = 1}^K x_{uv}^{q,K} - D y_u <= 0 since
         # all decision variables must be on the left-hand side for CPLEX.
         var_names = ['y_' + i for i in rep_nodes]
-        # Node that if we want to add 6 variables, we need to have 6 separate SparsePairs
-        link_constr_column = []
-        [link_constr_column.extend([cplex.SparsePair(ind=['LinkXYCon_' + i], val=[-self.D])]) for i in rep_nodes]
+        # Look up the constraint indices once per node (and pair) instead of in the inner loops
+        constraint_indices = self.constraint_indices
+        link_xy_cons = {i: constraint_indices['LinkXYCon', i] for i in rep_nodes}
+        # Node that if we want to add 6 variables, we need to have 6 separate SparsePairs, but they can share the
+        # same coefficient list
+        link_constr_coefficient = [-self.D]
+        link_constr_column = [cplex.SparsePair(ind=[link_xy_cons[i]], val=link_constr_coefficient) for i in rep_nodes]
         self.cplex.variables.add(obj=[1.0] * len(rep_nodes), names=var_names, ub=[1.0] * len(rep_nodes),
                                  types=['B'] * len(rep_nodes), columns=link_constr_column)
-        # Start with finding shortest paths once and store them in a dictionary for later use
-        shortest_path_dict = {}
-        for i in rep_nodes:
-            for j in rep_nodes:
-                if i != j:
-                    # Use NetworkX to generate the shortest path with Dijkstra's algorithm
-                    (path_cost, sp) = nx.single_source_dijkstra(G=graph, source=i, target=j, weight='length')
-                    # Store the path cost and the shortest path itself as a tuple in the dictionary
-                    shortest_path_dict[(i, j)] = (path_cost, sp)
+        # Start with finding all shortest paths once (Dijkstra's algorithm from every node is reused for all targets
+        # and all pairs) and store them in dictionaries for later use. Nodes further away than L_max can never be
+        # the end of an elementary link, so the search is cut off there and these nodes are simply not stored, which
+        # replaces the L_max constraint of the formulation.
+        shortest_path_lengths, shortest_paths = {}, {}
+        for source, (lengths, paths) in nx.all_pairs_dijkstra(G=graph, cutoff=self.L_max, weight='length'):
+            shortest_path_lengths[source] = lengths
+            shortest_paths[source] = paths
+        # The coefficients of a variable only depend on whether its endpoints are the source, the sink or a repeater
+        # node, so the coefficient lists can be shared by all variables (CPLEX copies them when the variable is added)
+        source_sink_coefficients = [1.0, -1.0, 1.0]
+        to_repeater_coefficients = [1.0, -1.0, 1.0, 1.0, 1.0]
+        repeater_sink_coefficients = [1.0, -1.0]
+        # Variable names only differ in their pair, their elementary link and the suffix of their copy k
+        k_suffixes = ['#' + str(k) for k in range(1, self.K + 1)]
         for q in self.graph_container.unique_end_node_pairs:
             pairname = "(" + q[0] + "," + q[1] + ")"
-            for i in rep_nodes + [q[0]]:
-                for j in rep_nodes + [q[1]]:
-                    if not i == j:
+            st_con = constraint_indices['STCon', q]
+            dis_link_cons = {u: constraint_indices['DisLinkCon', q, u] for u in rep_nodes}
+            source_cons, sink_cons, max_rep_cons = {}, {}, {}
+            for k in range(1, self.K + 1):
+                source_cons[k] = constraint_indices['SourceCon', q, k]
+                sink_cons[k] = constraint_indices['SinkCon', q, k]
+                max_rep_cons[k] = constraint_indices['MaxRepCon', q, k]
+            flow_cons = {u: {k: constraint_indices['FlowCon', q, u, k] for k in range(1, self.K + 1)}
+                         for u in rep_nodes}
+            # Collect the variables of this pair and add them to CPLEX in a single call
+            obj, names, columns, path_tuples = [], [], [], []
+            direct_position = None
+            # Possible start and end nodes of the elementary links of this pair
+            link_start_nodes = rep_nodes + [q[0]]
+            link_end_nodes = rep_nodes + [q[1]]
+            for i in link_start_nodes:
+                for j in link_end_nodes:
+                    if not i == j and j in shortest_path_lengths[i]:
                         # Skip paths where source and sink are equal or paths that start (end) at the sink (source)
-                        # And also skip paths that start or end at a city not in the currently considered pair
-                        if i in rep_nodes and j in rep_nodes:
-                            # We have already pre-computed this path
-                            (path_cost, sp) = shortest_path_dict[(i, j)]
-                        else:
-                            # Find shortest (s,t), (s,j) or (i,t) path
-                            (path_cost, sp) = nx.single_source_dijkstra(G=graph, source=i, target=j, weight='length')
-                        # Exclude elementary links of which the length exceeds L_max, which replaces the L_max
-                        # constraint of the formulation
-                        if path_cost <= self.L_max:
-                            for k in range(1, self.K + 1):
-                                # Select correct constraints for this elementary links variable
-                                if i == q[0]:  # Node i is the source
-                                    if j == q[1]:  # Node j is the sink
-                                        column = [cplex.SparsePair(ind=['SourceCon' + pairname + '#' + str(k),
-                                                                        'SinkCon' + pairname + '#' + str(k),
-                                                                        'STCon' + pairname],
-                                                                   val=[1.0, -1.0, 1.0])]
-                                    else:  # Node j is a possible repeater node
-                                        column = [cplex.SparsePair(ind=['SourceCon' + pairname + '#' + str(k),
-                                                                        'FlowCon' + pairname + "_" + str(j) + '#' + str(k),
-                                                                        'MaxRepCon' + pairname + '#' + str(k),
-                                                                        'DisLinkCon' + pairname + '_' + j,
-                                                                        'LinkXYCon_' + j],
-                                                                   val=[1.0, -1.0, 1.0, 1.0, 1.0])]
-                                else:  # Node i is a possible repeater node (note that i cannot be the sink)
-                                    if j == q[1]:  # Node j is the sink
-                                        column = [cplex.SparsePair(ind=['SinkCon' + pairname + '#' + str(k),
-                                                                        'FlowCon' + pairname + "_" + str(i) + '#' + str(k)],
-                                                                   val=[-1.0, 1.0])]
-                                    else:  # Node j is also a possible repeater node (note that j cannot be the source)
-                                        column = [cplex.SparsePair(ind=['FlowCon' + pairname + "_" + str(i) + '#' + str(k),
-                                                                        'FlowCon' + pairname + "_" + str(j) + '#' + str(k),
-                                                                        'MaxRepCon' + pairname + '#' + str(k),
-                                                                        'DisLinkCon' + pairname + '_' + j,
-                                                                        'LinkXYCon_' + j],
-                                                                   val=[1.0, -1.0, 1.0, 1.0, 1.0])]
-                                # Add x_{ij}^{q,K} variables
-                                cplex_var = self.cplex.variables.add(obj=[self.alpha * path_cost], ub=[1],
-                                                                     columns=column, types=['B'],
-                                                                     names=["x" + pairname + "_" + str(i) + "," + str(j)
-                                                                           + '#' + str(k)])
-                                # Add it to our variable map for future reference
-                                self.varmap[cplex_var[0]] = (q, sp, path_cost)
+                        # And also skip paths that start or end at a city not in the currently considered pair, or
+                        # between nodes that are not connected or further apart than L_max
+                        path_cost = shortest_path_lengths[i][j]
+                        sp = shortest_paths[i][j]
+                        if i == q[0] and j == q[1]:
+                            direct_position = len(columns)
+                        # Select the correct constraints for this elementary link once; the K copies only differ
+                        # in the outflow constraint of i and the inflow constraint of j (and the maximum number
+                        # of repeaters if j is a possible repeater node)
+                        out_cons = source_cons if i == q[0] else flow_cons[i]
+                        in_cons = sink_cons if j == q[1] else flow_cons[j]
+                        if j != q[1]:  # Node j is a possible repeater node (note that j cannot be the source)
+                            rep_cons = [dis_link_cons[j], link_xy_cons[j]]
+                            columns.extend(cplex.SparsePair(ind=[out_cons[k], in_cons[k], max_rep_cons[k]]
+                                                            + rep_cons, val=to_repeater_coefficients)
+                                           for k in range(1, self.K + 1))
+                        elif i == q[0]:  # Direct elementary link from the source to the sink
+                            columns.extend(cplex.SparsePair(ind=[out_cons[k], in_cons[k], st_con],
+                                                            val=source_sink_coefficients)
+                                           for k in range(1, self.K + 1))
+                        else:  # Node i is a possible repeater node and node j is the sink
+                            columns.extend(cplex.SparsePair(ind=[out_cons[k], in_cons[k]],
+                                                            val=repeater_sink_coefficients)
+                                           for k in range(1, self.K + 1))
+                        # Collect x_{ij}^{q,K} variables, of which the K copies share the same path data in the
+                        # variable map
+                        obj.extend([self.alpha * path_cost] * self.K)
+                        var_name = "x" + pairname + "_" + str(i) + "," + str(j)
+                        names.extend(var_name + k_suffix for k_suffix in k_suffixes)
+                        path_tuples.extend([(q, sp, path_cost)] * self.K)
+            if not columns:
+                continue
+            num_vars = len(columns)
+            cplex_vars = self.cplex.variables.add(obj=obj, ub=[1] * num_vars, columns=columns, types='B' * num_vars,
+                                                  names=names)
+            # Add them to our variable map for future reference
+            self.varmap.update(zip(cplex_vars, path_tuples))
+            if direct_position is not None:
+                self.direct_link_vars[q] = cplex_vars[direct_position]
 
 
 class PathBasedFormulation(Formulation):
     """Subclass for the path-based formulation."""
-    def __init__(self, graph_container, L_max, N_max, K, D, alpha, read_from_file=False):
+    # Type of the constraints that link the x and y variables, see `_update_parameter`
+    _link_con_type = 'LinkCon'
+
+    def __init__(self, graph_container, L_max, N_max, K, D, alpha, read_from_file=False, cplex_params=None,
+                 threads=None, time_limit=None, stall_time=None, num_workers=1, cache_dir=None):
         super().__init__(graph_container=graph_container, L_max=L_max, N_max=N_max, K=K,
-                         D=D, alpha=alpha, read_from_file=read_from_file, )
+                         D=D, alpha=alpha, read_from_file=read_from_file, cplex_params=cplex_params, threads=threads,
+                         time_limit=time_limit, stall_time=stall_time, num_workers=num_workers, cache_dir=cache_dir)
+        # Paths are only generated up to this number of repeaters, so N_max can only be lowered in place
+        self.constructed_N_max = self.N_max
+        # The node-disjointness constraints are only added for K > 1, see `_add_constraints`
+        self.constructed_K = self.K
 
     def _compute_expected_number_of_variables(self):
-        num_vars_per_pair = 1
-        for r in range(1, self.N_max + 1):
-            num_vars_per_pair += np.math.factorial(self.graph_container.num_repeater_nodes) / \
-                                 np.math.factorial(self.graph_container.num_repeater_nodes - r)
+        # Only one path is kept per set of r repeater nodes, see `_generate_paths_for_pair`
+        num_vars_per_pair = 1 + sum(math.comb(self.graph_container.num_repeater_nodes, r)
+                                    for r in range(1, self.N_max + 1))
         num_vars = self.graph_container.num_unique_pairs * num_vars_per_pair + self.graph_container.num_repeater_nodes
         return int(num_vars)
 
+    def _check_parameter_update(self, name, value):
+        if name == 'N_max':
+            if value > self.constructed_N_max:
+                raise ValueError("N_max can only be increased up to the value {} with which the formulation was "
+                                 "constructed.".format(self.constructed_N_max))
+        elif name == 'K':
+            if value > 1 and self.constructed_K == 1:
+                raise ValueError("K can only be increased above 1 if the formulation was constructed with K > 1, "
+                                 "since it has no node-disjointness constraints otherwise.")
+        else:
+            super()._check_parameter_update(name, value)
+
+    def _update_parameter(self, name, value):
+        if name == 'K':
+            # Right-hand side of the constraints that connect every pair K times
+            self.cplex.linear_constraints.set_rhs([(self.constraint_indices['PairCon', q], float(value))
+                                                   for q in self.graph_container.unique_end_node_pairs])
+        elif name == 'N_max':
+            # Forbid the paths that use more repeater nodes than the new N_max
+            self.cplex.variables.set_upper_bounds([(index, 1.0 if len(r_up) <= value else 0.)
+                                                   for index, (_, r_up, _) in self.varmap.items()])
+        else:
+            super()._update_parameter(name, value)
+
     def _add_constraints(self):
         """Add the constraints of the path-based formulation. Note that the constraints that use L_max and N_max are
         applied while adding the variables, since this requires less decision variables in total."""
@@ -276,28 +567,33 @@ class PathBasedFormulation(Formulation):
         num_repeater_nodes = self.graph_container.num_repeater_nodes
         # Constraints for connecting each pair exactly K times. Note that this differs from the formulation in the paper
         # because it is easier to implement this compared to defining all the sets P_q for all q in Q.
-        pair_con_names = ['PairCon' + "(" + q[0] + "," + q[1] + ")" for q in self.graph_container.unique_end_node_pairs]
-        self.cplex.linear_constraints.add(rhs=[float(self.K)] * self.graph_container.num_unique_pairs,
-                                          senses=['E'] * self.graph_container.num_unique_pairs, names=pair_con_names)
+        pair_con_keys = [('PairCon', q) for q in self.graph_container.unique_end_node_pairs]
+        indices = self.cplex.linear_constraints.add(rhs=[float(self.K)] * self.graph_container.num_unique_pairs,
+                                                    senses=['E'] * self.graph_container.num_unique_pairs)
+        self.constraint_indices.update(zip(pair_con_keys, indices))
         # Constraints for linking path variables to repeater variables
-        link_con_names = ['LinkCon_' + s for s in self.graph_container.possible_rep_nodes]
-        self.cplex.linear_constraints.add(rhs=[0] * num_repeater_nodes,
-                                          senses=['L'] * num_repeater_nodes, names=link_con_names)
-        # Constraints for disjoint elementary link paths
-        disjoint_con_names = []
-        for q in self.graph_container.unique_end_node_pairs:
-            pairname = "(" + q[0] + "," + q[1] + ")"
-            for u in self.graph_container.possible_rep_nodes + [q[0]]:
-                disjoint_con_names.append('NodeDisjointCon' + pairname + '_' + u)
-        self.cplex.linear_constraints.add(rhs=[1] * len(disjoint_con_names), senses=['L'] * len(disjoint_con_names),
-                                          names=disjoint_con_names)
+        link_con_keys = [('LinkCon', s) for s in self.graph_container.possible_rep_nodes]
+        indices = self.cplex.linear_constraints.add(rhs=[0] * num_repeater_nodes, senses=['L'] * num_repeater_nodes)
+        self.constraint_indices.update(zip(link_con_keys, indices))
+        # Constraints for disjoint elementary link paths. For K = 1 exactly one path is chosen per pair, which uses every
+        # repeater node at most once, so these constraints are only needed for K > 1. The source is never a repeater
+        # node of a path, so only the repeater nodes need a constraint.
+        if self.K > 1:
+            disjoint_con_keys = []
+            for q in self.graph_container.unique_end_node_pairs:
+                for u in self.graph_container.possible_rep_nodes:
+                    disjoint_con_keys.append(('NodeDisjointCon', q, u))
+            indices = self.cplex.linear_constraints.add(rhs=[1] * len(disjoint_con_keys),
+                                                        senses=['L'] * len(disjoint_con_keys))
+            self.constraint_indices.update(zip(disjoint_con_keys, indices))
         # Add repeater variables with a column in the linking constraint. Note that we actually implement
         # sum_{p in P} r_up x_p - D y_u <= 0 since all decision variables must be on the left-hand side for CPLEX.
         var_names = ['y_' + s for s in self.graph_container.possible_rep_nodes]
-        # Node that if we want to add 6 variables, we need to have 6 separate SparsePairs
-        link_constr_column = []
-        [link_constr_column.extend([cplex.SparsePair(ind=['LinkCon_' + i],
-                                                     val=[-self.D])]) for i in self.graph_container.possible_rep_nodes]
+        # Node that if we want to add 6 variables, we need to have 6 separate SparsePairs, but they can share the
+        # same coefficient list
+        link_constr_coefficient = [-self.D]
+        link_constr_column = [cplex.SparsePair(ind=[self.constraint_indices['LinkCon', i]], val=link_constr_coefficient)
+                              for i in self.graph_container.possible_rep_nodes]
         # Note that these variables have a lower bound of 0 by default
         self.cplex.variables.add(obj=[1] * num_repeater_nodes, names=var_names, ub=[1] * num_repeater_nodes,
                                  types=['B'] * num_repeater_nodes, columns=link_constr_column)
@@ -305,38 +601,191 @@ class PathBasedFormulation(Formulation):
     def _add_variables(self):
         """Generate all possible feasible paths that adhere to the L_max and N_max constraints and link them to the
         corresponding constraints and possibly the objective function if alpha is greater than zero."""
-        for q in self.graph_container.unique_end_node_pairs:
-            pairname = "(" + q[0] + "," + q[1] + ")"
-            all_paths = []
-            # By construction a path starts at the source s
-            self._generate_paths(path=[q[0]], sink=q[1], r_up=[], w_p=0, all_paths=all_paths)
-            for tup in all_paths:
-                # Now generate a variable for each path
-                full_path = tup[0]
-                r_up = tup[1]
-                full_path_cost = tup[2]
-                # Note that these variables have a lower bound of 0 by default
-                indices = ['PairCon' + pairname] + ['LinkCon_' + i for i in r_up] + \
-                          ['NodeDisjointCon' + pairname + '_' + i for i in r_up]
-                column_contributions = [cplex.SparsePair(ind=indices, val=[1.0] * len(indices))]
-                cplex_var = self.cplex.variables.add(obj=[self.alpha * full_path_cost], ub=[1.0], types=['B'],
-                                                     columns=column_contributions)
-                # Add it to our variable map for future reference
-                self.varmap[cplex_var[0]] = (q, full_path, r_up, full_path_cost)
-
-    def _generate_paths(self, path, sink, r_up, w_p, all_paths):
-        """Function for recursively generating all (s, t) paths, together with the corresponding parameters r_up and
-        w_p, where w_p denotes the total cost (length) of path p."""
-        # Generate a path from here to the sink t
-        (path_cost, sp) = nx.single_source_dijkstra(G=self.graph_container.graph, source=path[-1],
-                                                    target=sink, weight='length')
-        if path_cost <= self.L_max:
-            all_paths.append((path + sp[1:], r_up, w_p + path_cost))
-        if len(r_up) < self.N_max:
-            for rep_node in self.graph_container.possible_rep_nodes:
-                if rep_node not in r_up and rep_node in nx.descendants(G=self.graph_container.graph, source=path[-1]):
-                    (path_cost, sp) = nx.single_source_dijkstra(G=self.graph_container.graph, source=path[-1],
-                                                                target=rep_node, weight='length')
-                    if path_cost <= self.L_max:
-                        self._generate_paths(path=path + sp[1:], sink=sink, r_up=r_up + [rep_node], w_p=w_p + path_cost,
-                                             all_paths=all_paths)
+        # Compute all shortest path lengths once, since `_generate_paths` needs them from many different nodes. The
+        # paths themselves are only constructed for the chosen variables, see `get_full_path`. Only lengths up to L_max
+        # are of interest, so the searches are cut off there and nodes further away are simply not stored.
+        self.shortest_path_lengths = dict(nx.all_pairs_dijkstra_path_length(G=self.graph_container.graph,
+                                                                             cutoff=self.L_max, weight='length'))
+        # For every node, store the repeater nodes that can be reached from it with a single elementary link, together
+        # with the length of the shortest path to them. These are the only candidates for extending a path in
+        # `_generate_paths`, so the L_max check is done once per combination of nodes here instead of once per path
+        # prefix.
+        self.elementary_link_candidates = {}
+        for node, lengths in self.shortest_path_lengths.items():
+            self.elementary_link_candidates[node] = [(rep_node, lengths[rep_node])
+                                                     for rep_node in self.graph_container.possible_rep_nodes
+                                                     if rep_node in lengths]
+        # Look up the constraint indices once per node (and pair) instead of once per path
+        constraint_indices = self.constraint_indices
+        link_cons = {i: constraint_indices['LinkCon', i] for i in self.graph_container.possible_rep_nodes}
+        # A path with r repeaters has a coefficient of one in exactly 2r + 1 constraints (r + 1 without the
+        # node-disjointness constraints for K = 1), so the coefficient lists can be shared by all paths with the same
+        # number of repeaters (CPLEX copies them when the variable is added)
+        cons_per_repeater = 2 if self.K > 1 else 1
+        coefficients = [[1.0] * (cons_per_repeater * r + 1) for r in range(self.N_max + 1)]
+        if self.num_workers > 1 and self.graph_container.num_unique_pairs > 1:
+            # The paths of different pairs are independent, so generate them in worker processes. The variables are
+            # still added to CPLEX in this process, while the workers generate the paths of the next pairs.
+            with ProcessPoolExecutor(max_workers=self.num_workers, initializer=_set_worker_formulation,
+                                     initargs=(self,)) as executor:
+                self._add_path_variables(executor.map(_generate_paths_in_worker,
+                                                      self.graph_container.unique_end_node_pairs),
+                                         link_cons, coefficients)
+        else:
+            self._add_path_variables(map(self._generate_paths_for_pair, self.graph_container.unique_end_node_pairs),
+                                     link_cons, coefficients)
+        # The shortest path lengths are only needed to generate the paths
+        del self.shortest_path_lengths, self.elementary_link_candidates
+
+    def _add_path_variables(self, all_paths_per_pair, link_cons, coefficients):
+        """Add a variable for every path of every pair, where `all_paths_per_pair` gives the paths of the pairs in the
+        order of `unique_end_node_pairs` (see `_add_variables`)."""
+        constraint_indices = self.constraint_indices
+        for q, all_paths in zip(self.graph_container.unique_end_node_pairs, all_paths_per_pair):
+            pair_con = constraint_indices['PairCon', q]
+            if self.K > 1:
+                disjoint_cons = {i: constraint_indices['NodeDisjointCon', q, i]
+                                 for i in self.graph_container.possible_rep_nodes}
+            if not all_paths:
+                continue
+            # Now generate a variable for each path and add them to CPLEX in a single call
+            columns = []
+            for r_up, full_path_cost in all_paths:
+                indices = [pair_con]
+                indices.extend(link_cons[i] for i in r_up)
+                if self.K > 1:
+                    indices.extend(disjoint_cons[i] for i in r_up)
+                columns.append(cplex.SparsePair(ind=indices, val=coefficients[len(r_up)]))
+            # Note that these variables have a lower bound of 0 by default
+            num_vars = len(all_paths)
+            cplex_vars = self.cplex.variables.add(obj=[self.alpha * tup[1] for tup in all_paths], ub=[1.0] * num_vars,
+                                                  types='B' * num_vars, columns=columns)
+            for idx, (r_up, full_path_cost) in zip(cplex_vars, all_paths):
+                # Add it to our variable map for future reference. Only the repeater nodes are stored instead of the
+                # full path, since the full path is only needed for the few variables that are chosen in the solution.
+                self.varmap[idx] = (q, r_up, full_path_cost)
+                if not r_up:
+                    self.direct_link_vars[q] = idx
+
+    def get_full_path(self, q, r_up):
+        """Return the full path of source-destination pair q that uses the repeater nodes r_up (in this order), which
+        consists of the shortest paths between consecutive nodes of (s, r_up, t)."""
+        nodes = [q[0]] + list(r_up) + [q[1]]
+        full_path = [q[0]]
+        for u, v in zip(nodes[:-1], nodes[1:]):
+            full_path.extend(nx.dijkstra_path(G=self.graph_container.graph, source=u, target=v, weight='length')[1:])
+        return full_path
+
+    def _generate_paths_for_pair(self, q):
+        """Generate the feasible paths of source-destination pair q, see `_generate_paths`. The column of a path
+        variable only depends on the set of repeater nodes of the path and not on their order, so of all paths that
+        use the same set of repeater nodes only the shortest one is kept. The others can never improve the objective."""
+        all_paths = []
+        self._generate_paths(source=q[0], sink=q[1], all_paths=all_paths)
+        shortest_path_per_rep_set = {}
+        for tup in all_paths:
+            rep_set = frozenset(tup[0])
+            if rep_set not in shortest_path_per_rep_set or tup[1] < shortest_path_per_rep_set[rep_set][1]:
+                shortest_path_per_rep_set[rep_set] = tup
+        return list(shortest_path_per_rep_set.values())
+
+    def _generate_paths(self, source, sink, all_paths):
+        """Function for generating all (s, t) paths with a depth-first search, where every path is given by its
+        repeater nodes r_up and its total cost (length) w_p. The full path can be obtained from r_up with
+        `get_full_path`. An explicit stack of path prefixes (node, r_up, w_p) is used instead of recursion.
+
+        Since only the shortest path per set of repeater nodes is kept (see `_generate_paths_for_pair`), a prefix is
+        not extended if a prefix that ends in the same node and uses the same set of repeater nodes was already found
+        with a cost that is not higher. All its extensions would use the same sets of repeater nodes as the extensions
+        of that prefix, but with a cost that is not lower. A prefix is also not extended to a repeater node from which
+        the sink cannot be reached with the remaining number of repeater nodes."""
+        # Use some local references for shorter notation (and faster look-ups in the loop)
+        shortest_path_lengths = self.shortest_path_lengths
+        elementary_link_candidates = self.elementary_link_candidates
+        N_max = self.N_max
+        # Minimum number of elementary links from every repeater node to the sink t (up to N_max), computed with a
+        # breadth-first search from t. Note that the elementary-link candidates are symmetric, since the graph is
+        # undirected.
+        hops_to_sink = {sink: 0}
+        frontier = [sink]
+        hops = 0
+        while frontier and hops < N_max:
+            hops += 1
+            next_frontier = []
+            for node in frontier:
+                for rep_node, _ in elementary_link_candidates[node]:
+                    if rep_node not in hops_to_sink:
+                        hops_to_sink[rep_node] = hops
+                        next_frontier.append(rep_node)
+            frontier = next_frontier
+        # Lowest cost of the prefixes found so far per combination of end node and set of repeater nodes
+        best_prefix_costs = {}
+        # By construction a path starts at the source s
+        stack = [(source, [], 0)]
+        while stack:
+            node, r_up, w_p = stack.pop()
+            if len(r_up) > 2:
+                # Prefixes with at most two repeater nodes are uniquely determined by their end node and set of
+                # repeater nodes, so only longer prefixes can be dominated
+                prefix_key = (node, frozenset(r_up))
+                if best_prefix_costs.get(prefix_key, math.inf) <= w_p:
+                    continue
+                best_prefix_costs[prefix_key] = w_p
+            # Generate a path from here to the sink t
+            lengths = shortest_path_lengths[node]
+            if sink in lengths:
+                all_paths.append((r_up, w_p + lengths[sink]))
+            if len(r_up) < N_max - 1:
+                # A path that continues to a repeater node needs at least as many elementary links from there to the
+                # sink t as the number of repeater nodes that it can still use
+                max_hops = N_max - len(r_up)
+                # Push the extensions in reverse order, so that they are popped (and the paths generated) in the same
+                # order as with a recursive depth-first search
+                for rep_node, path_cost in reversed(elementary_link_candidates[node]):
+                    if rep_node not in r_up and hops_to_sink.get(rep_node, max_hops + 1) <= max_hops:
+                        stack.append((rep_node, r_up + [rep_node], w_p + path_cost))
+            elif len(r_up) < N_max:
+                # Paths that use the last allowed repeater node cannot be extended any further, so instead of pushing
+                # them on the stack, directly generate the path from the last repeater node to the sink t
+                for rep_node, path_cost in elementary_link_candidates[node]:
+                    if rep_node not in r_up:
+                        lengths = shortest_path_lengths[rep_node]
+                        if sink in lengths:
+                            all_paths.append((r_up + [rep_node], w_p + path_cost + lengths[sink]))
+
+
+# Formulation used by the current worker process to generate paths, see `PathBasedFormulation._add_variables`
+_worker_formulation = None
+
+
+def _set_worker_formulation(formulation):
+    """Initializer of a worker process, which stores the formulation that is sent to it once."""
+    global _worker_formulation
+    _worker_formulation = formulation
+
+
+def _generate_paths_in_worker(q):
+    """Generate all feasible paths of source-destination pair q in a worker process."""
+    return _worker_formulation._generate_paths_for_pair(q)
+
+
+class _StallAborter:
+    """Generic CPLEX callback that aborts the optimization once the best solution found so far (the incumbent) has not
+    improved for `stall_time` seconds, see `Formulation.solve`."""
+    def __init__(self, stall_time):
+        self.stall_time = stall_time
+        self.best_objective = math.inf
+        self.last_improvement_time = 0.
+
+    def invoke(self, context):
+        """Called by CPLEX whenever there is global progress in the branch-and-bound search."""
+        if not context.get_int_info(context.info.feasible):
+            # No solution has been found yet
+            return
+        current_time = context.get_double_info(context.info.time)
+        objective = context.get_double_info(context.info.best_solution)
+        if objective < self.best_objective:
+            self.best_objective = objective
+            self.last_improvement_time = current_time
+        elif current_time - self.last_improvement_time >= self.stall_time:
+            context.abort()
@@ -1,9 +1,9 @@
 import numpy as np
 from scipy.spatial import ConvexHull
-import matplotlib.pyplot as plt
 import networkx as nx
 import itertools
 import ast
+import sys
 
 
 class GraphContainer:
@@ -21,6 +21,10 @@ class GraphContainer:
         List of the end nodes, i.e. the set C in the paper.
     num_end_nodes : int
         The total number of end nodes, so the size of set C.
+    end_node_set : frozenset
+        The end nodes as a set, for constant-time membership tests.
+    pos : dict
+        The position of every node that has a 'pos' attribute, which is used for drawing the graph and its solutions.
     possible_rep_nodes : list
         List of all possible repeater node locations, i.e. the set R in the paper.
     num_repeater_nodes : int
@@ -30,17 +34,24 @@ class GraphContainer:
         is undirected and therefore the inverse path from destination to source is always the same.
     num_unique_pairs : int
         The total number of unique source-destination pairs, so the sie of the set Q.
+    min_edge_length : dict
+        Length of the shortest edge of every end node (infinite for an end node without edges). No path can leave an
+        end node if this exceeds L_max.
     """
     def __init__(self, graph):
         self.graph = graph
         self.end_nodes = []
         self.possible_rep_nodes = []
         for node, nodedata in graph.nodes.items():
+            # Intern the node names, since they are used as dictionary keys (and to construct the names of constraints
+            # and variables) in the inner loops of the formulations
             if nodedata["type"] == 'end_node':
-                self.end_nodes.append(node)
+                self.end_nodes.append(sys.intern(node))
             else:
-                self.possible_rep_nodes.append(node)
+                self.possible_rep_nodes.append(sys.intern(node))
         self.num_end_nodes = len(self.end_nodes)
+        self.end_node_set = frozenset(self.end_nodes)
+        self.pos = nx.get_node_attributes(graph, 'pos')
         if self.num_end_nodes == 0:
             raise ValueError("Must have at least one city.")
         self.num_repeater_nodes = len(self.possible_rep_nodes)
@@ -51,45 +62,54 @@ class GraphContainer:
             if city not in self.graph.nodes():
                 raise ValueError("City {} not found in list of nodes {}".format(city, self.graph.nodes()))
         self.unique_end_node_pairs = list(itertools.combinations(self.end_nodes, r=2))
-        self.num_unique_pairs = len(list(self.unique_end_node_pairs))
-        # Add length parameter to edges if this is not defined yet
-        for i, j in graph.edges():
-            if 'length' not in graph[i][j]:
-                if 'Longitude' in graph.nodes[self.possible_rep_nodes[0]]:
-                    self._compute_dist_lat_lon(graph)
-                else:
-                    self._compute_dist_cartesian(graph)
-                break
+        self.num_unique_pairs = len(self.unique_end_node_pairs)
+        # All end nodes should be in the connected component of the first end node
+        component = nx.node_connected_component(graph, self.end_nodes[0])
+        if not self.end_node_set <= component:
+            city = next(city for city in self.end_nodes if city not in component)
+            raise ValueError("End nodes {} and {} are not connected.".format(self.end_nodes[0], city))
+        # Add length parameter to edges if this is not defined yet (for any of the edges)
+        if any(length is None for _, _, length in graph.edges(data='length')):
+            if 'Longitude' in graph.nodes[self.possible_rep_nodes[0]]:
+                self._compute_dist_lat_lon(graph)
+            else:
+                self._compute_dist_cartesian(graph)
+        self.min_edge_length = {city: min((length for _, _, length in graph.edges(city, data='length')),
+                                          default=float('inf'))
+                                for city in self.end_nodes}
         # print("Constructed graph container. Number of nodes: {}, number of edges {}, number of cities to connect: {}."
         #       .format(self.num_nodes, len(self.graph.edges()), self.num_cities))
 
+    @staticmethod
+    def _edge_endpoint_attributes(graph, edges, attribute):
+        """Return two arrays with the value of a node attribute at the first and at the second endpoint of all edges."""
+        first = np.fromiter((graph.nodes[u][attribute] for u, _ in edges), dtype=np.float64, count=len(edges))
+        second = np.fromiter((graph.nodes[v][attribute] for _, v in edges), dtype=np.float64, count=len(edges))
+        return first, second
+
     @staticmethod
     def _compute_dist_lat_lon(graph):
         """Compute the distance in km between two points based on their latitude and longitude.
-        Assumes both are given in radians."""
+        Assumes both are given in degrees. The haversine formula is evaluated for all edges at once."""
         R = 6371  # Radius of the earth in km
-        for edge in graph.edges():
-            node1, node2 = edge
-            lon1 = np.radians(graph.nodes[node1]['Longitude'])
-            lon2 = np.radians(graph.nodes[node2]['Longitude'])
-            lat1 = np.radians(graph.nodes[node1]['Latitude'])
-            lat2 = np.radians(graph.nodes[node2]['Latitude'])
-            delta_lat = lat2 - lat1
-            delta_lon = lon2 - lon1
-            a = np.sin(delta_lat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * (np.sin(delta_lon / 2) ** 2)
-            c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-            dist = np.round(R * c, 5)
-            graph.edges[node1, node2]['length'] = dist
+        edges = list(graph.edges())
+        lon1, lon2 = np.radians(GraphContainer._edge_endpoint_attributes(graph, edges, 'Longitude'))
+        lat1, lat2 = np.radians(GraphContainer._edge_endpoint_attributes(graph, edges, 'Latitude'))
+        delta_lat = lat2 - lat1
+        delta_lon = lon2 - lon1
+        a = np.sin(delta_lat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * (np.sin(delta_lon / 2) ** 2)
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        dist = np.round(R * c, 5)
+        nx.set_edge_attributes(graph, dict(zip(edges, dist.tolist())), name='length')
 
     @staticmethod
     def _compute_dist_cartesian(graph):
-        """Compute the distance in km between two points based on their Cartesian coordinates."""
-        for edge in graph.edges():
-            node1, node2 = edge
-            dx = np.abs(graph.nodes[node1]['xcoord'] - graph.nodes[node2]['xcoord'])
-            dy = np.abs(graph.nodes[node1]['ycoord'] - graph.nodes[node2]['ycoord'])
-            dist = np.round(np.sqrt(np.square(dx) + np.square(dy)), 5)
-            graph.edges[node1, node2]['length'] = dist
+        """Compute the distance in km between two points based on their Cartesian coordinates, for all edges at once."""
+        edges = list(graph.edges())
+        x1, x2 = GraphContainer._edge_endpoint_attributes(graph, edges, 'xcoord')
+        y1, y2 = GraphContainer._edge_endpoint_attributes(graph, edges, 'ycoord')
+        dist = np.round(np.hypot(x1 - x2, y1 - y2), 5)
+        nx.set_edge_attributes(graph, dict(zip(edges, dist.tolist())), name='length')
 
     def print_graph_data(self):
         total_length, min_length, max_length = 0, 1e10, 0
@@ -219,6 +239,8 @@ def create_graph_and_partition(num_nodes, radius, draw=False, seed=None):
 
 
 def draw_graph(G):
+    # Only import matplotlib when actually drawing, so that headless (batch) runs do not pay for it
+    import matplotlib.pyplot as plt
     pos = nx.get_node_attributes(G, 'pos')
     repeater_nodes = []
     end_nodes = []
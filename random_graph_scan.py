@@ -1,12 +1,16 @@
 from formulations import LinkBasedFormulation
 from graph_tools import GraphContainer, create_graph_and_partition
 import numpy as np
-import matplotlib.pyplot as plt
 from datetime import datetime
 import pickle
 import networkx as nx
 from copy import deepcopy
 import time
+import random
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 
 class RandomGraphScan:
@@ -38,6 +42,8 @@ class RandomGraphScan:
         Quantum-repeater capacity.
     K : int
         Robustness parameter.
+    num_workers : int, optional
+        Number of worker processes used to generate the initial population of graphs, see `generate_feasible_graphs`.
 
     Notes
     -----
@@ -46,7 +52,7 @@ class RandomGraphScan:
     """
 
     def __init__(self, scan_param_name, scan_param_min, scan_param_max, scan_param_step,
-                 num_graphs, num_nodes, radius, alpha, L_max, N_max, D, K):
+                 num_graphs, num_nodes, radius, alpha, L_max, N_max, D, K, num_workers=1):
 
         self.scan_param_name = scan_param_name
         self.scan_param_min = scan_param_min
@@ -86,15 +92,17 @@ class RandomGraphScan:
                              .format(scan_param_name))
 
         # generate population of graphs which are feasible for most restrictive values
-        self.generate_new_graphs(num_graphs)
+        self.generate_new_graphs(num_graphs, num_workers=num_workers)
 
-    def generate_new_graphs(self, num_extra_graphs):
+    def generate_new_graphs(self, num_extra_graphs, num_workers=1):
         """Increase graph population. Requires solve to be called again.
 
         Parameters
         ----------
         num_extra_graphs : int
             Number of graphs to be added to the population of each data point.
+        num_workers : int, optional
+            Number of worker processes used to generate the graphs, see `generate_feasible_graphs`.
 
         Note
         ----
@@ -110,6 +118,7 @@ class RandomGraphScan:
                                                                 num_nodes=self.num_nodes,
                                                                 radius=self.radius,
                                                                 alpha=self.alpha,
+                                                                num_workers=num_workers,
                                                                 **self.most_restrictive_parameters)
         self.graphs += new_graphs
         new_solutions_data = [solution.get_solution_data() for solution in new_solutions]
@@ -148,13 +157,19 @@ class RandomGraphScan:
             self.graphs = other_random_graph_scan.graphs
             self.solutions_data = {}
 
-    def solve(self, overwrite=False):
+    def solve(self, overwrite=False, num_workers=1, cache_dir=None):
         """Find the solutions. Can be computationally heavy.
 
         Parameters
         ----------
         overwrite : bool
             If true, existing solutions are discarded, and all graphs are solved again for each data point.
+        num_workers : int, optional
+            Number of worker processes that solve graphs in parallel. With the default of 1 the graphs are solved one
+            after another in the current process.
+        cache_dir : str, optional
+            Directory in which the solution data of every solved graph is stored, such that graphs that were already
+            solved for the same parameters (also in earlier runs or by other scans) are not solved again.
 
         Note
         ----
@@ -163,29 +178,40 @@ class RandomGraphScan:
         """
 
         parameters = deepcopy(self.most_restrictive_parameters)
-        for value in self.range:
+        # Existing solutions for every parameter value and the parameter values without a solution for every graph.
+        # The values are ordered from the most to the least restrictive one, see `_solve_graph_for_values`.
+        solutions_data = {}
+        values_without_solution = [[] for _ in self.graphs]
+        for value in sorted(self.range, reverse=self.scan_param_name == "K"):
             if value in self.solutions_data.keys() and not overwrite:
-                solutions_data_this_value = self.solutions_data[value]
-                num_missing_solutions = self.num_graphs - len(solutions_data_this_value)
+                solutions_data[value] = self.solutions_data[value]
             else:
-                solutions_data_this_value = []
-                num_missing_solutions = self.num_graphs
-            print("solving {} graphs for {} = {}".format(num_missing_solutions, self.scan_param_name, value))
-            start_time = time.time()
-            if num_missing_solutions != 0:
-                # skip if all solutions are already present for this parameter value
-                parameters.update({self.scan_param_name: value})
-                graphs_without_solution = self.graphs[-num_missing_solutions:]
-                for graph in graphs_without_solution:
-                    [new_solution] = solve_graphs(graph_containers=[graph],
-                                                  alpha=self.alpha,
-                                                  **parameters)
-                    solutions_data_this_value.append(new_solution.get_solution_data())
-            calculation_time = time.time() - start_time
-            print("Solving {} graphs succeeded after {} seconds.".format(num_missing_solutions, calculation_time))
-            self.computation_time += calculation_time
-            assert len(solutions_data_this_value) == self.num_graphs
-            self.solutions_data.update({value: solutions_data_this_value})
+                solutions_data[value] = []
+            # the graphs without a solution are always the last ones
+            for graph_index in range(len(solutions_data[value]), self.num_graphs):
+                values_without_solution[graph_index].append(value)
+        num_missing_solutions = sum(len(values) for values in values_without_solution)
+        print("solving {} graphs for {} values of {}".format(num_missing_solutions, len(self.range),
+                                                             self.scan_param_name))
+        start_time = time.time()
+        arguments = (self.graphs, repeat(self.alpha), repeat(parameters), repeat(self.scan_param_name),
+                     values_without_solution, repeat(cache_dir))
+        if num_workers > 1:
+            # The graphs are independent, so solve them in worker processes
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                new_solutions_data = list(executor.map(_solve_graph_for_values, *arguments))
+        else:
+            new_solutions_data = list(map(_solve_graph_for_values, *arguments))
+        # The graphs are handled in order, so the solutions of every value stay in the same order as the graphs
+        for values, new_solutions_data_this_graph in zip(values_without_solution, new_solutions_data):
+            for value, solution_data in zip(values, new_solutions_data_this_graph):
+                solutions_data[value].append(solution_data)
+        calculation_time = time.time() - start_time
+        print("Solving {} graphs succeeded after {} seconds.".format(num_missing_solutions, calculation_time))
+        self.computation_time += calculation_time
+        for value in self.range:
+            assert len(solutions_data[value]) == self.num_graphs
+            self.solutions_data.update({value: solutions_data[value]})
 
     def save(self, save_name):
         """Save object as pickle.
@@ -222,19 +248,17 @@ def plot_random_graph_scan(random_graph_scan, quantity, ylabel):
         Label to put on y-axis.
 
     """
+    import matplotlib.pyplot as plt
 
-    quantity_average = []
-    quantity_error = []
     for value in random_graph_scan.range:
         if value not in random_graph_scan.solutions_data.keys():
             raise ValueError("No solutions available for {}={}, cannot process."
                              .format(random_graph_scan.scan_param_name, value))
-        solutions_data_this_value = random_graph_scan.solutions_data[value]
-        quantity_list = []
-        for solution_data in solutions_data_this_value:
-            quantity_list.append(solution_data[quantity])
-        quantity_average.append(np.mean(quantity_list))
-        quantity_error.append(np.std(quantity_list) / np.sqrt(len(quantity_list)))
+    # Every value has a solution for every graph, so the quantities form an array of shape (values, graphs)
+    quantities = np.array([[solution_data[quantity] for solution_data in random_graph_scan.solutions_data[value]]
+                           for value in random_graph_scan.range], dtype=float)
+    quantity_average = quantities.mean(axis=1)
+    quantity_error = quantities.std(axis=1) / np.sqrt(quantities.shape[1])
     plt.errorbar(x=random_graph_scan.range, y=quantity_average, yerr=quantity_error)
     plt.ylabel(ylabel)
     plt.xlabel(random_graph_scan.scan_param_name)
@@ -291,7 +315,7 @@ def computation_time_vs_number_of_nodes(n_min, n_max, n_step, num_graphs, radius
                     print(comp_times, file=f)
 
 
-def generate_feasible_graphs(num_graphs, num_nodes, radius, alpha, L_max, N_max, D, K):
+def generate_feasible_graphs(num_graphs, num_nodes, radius, alpha, L_max, N_max, D, K, num_workers=1):
     """Generate a population of geometric random graphs with feasible solutions for specified parameters.
 
     Parameters
@@ -312,6 +336,9 @@ def generate_feasible_graphs(num_graphs, num_nodes, radius, alpha, L_max, N_max,
         Quantum-repeater capacity.
     K : int
         Robustness parameter.
+    num_workers : int, optional
+        Number of worker processes that generate graphs in parallel. With the default of 1 the graphs are generated
+        one after another in the current process.
 
     Returns
     -------
@@ -326,6 +353,19 @@ def generate_feasible_graphs(num_graphs, num_nodes, radius, alpha, L_max, N_max,
     """
 
     graph_containers, solutions, computation_times = [], [], []
+    if num_workers > 1:
+        # Every call of generate_feasible_graph is independent and only returns once it has found a feasible graph, so
+        # exactly num_graphs calls can be done in worker processes. Every worker reseeds the random module, since the
+        # random graphs of forked workers would otherwise all be the same.
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=random.seed) as executor:
+            futures = [executor.submit(generate_feasible_graph, num_nodes=num_nodes, radius=radius, alpha=alpha,
+                                       L_max=L_max, N_max=N_max, D=D, K=K) for _ in range(num_graphs)]
+            for future in futures:
+                graph_container, solution, computation_time = future.result()
+                graph_containers.append(graph_container)
+                solutions.append(solution)
+                computation_times.append(computation_time)
+        return graph_containers, solutions, computation_times
     number_of_found_graphs = 0
     number_of_tries = 0
     while number_of_found_graphs < num_graphs:
@@ -392,10 +432,12 @@ def generate_feasible_graph(num_nodes, radius, alpha, L_max, N_max, D, K):
         solution, computation_time = prog.solve()
         print("obtained solution")
         prog.clear()  # Clear the reference to the cplex object
-        graph.clear()
         if solution.feasible:
             print("Feasible!")
             break
+        # Only the graphs that are not returned can be cleared, since the returned graph is solved again for other
+        # parameter values by RandomGraphScan.solve
+        graph.clear()
     return graph_container, solution, computation_time
 
 
@@ -435,6 +477,70 @@ def solve_graphs(graph_containers, alpha, L_max, N_max, D, K):
     return solutions
 
 
+def _solve_graph_for_values(graph_container, alpha, parameters, scan_param_name, values, cache_dir=None):
+    """Solve the repeater allocation problem for a single graph for several values of the scan parameter and return
+    the data of the solutions, see `RandomGraphScan.solve`. The values should be ordered from the most to the least
+    restrictive value, such that the solution for the previous value is also feasible for the next value and can be
+    used as a warm start. If `cache_dir` is given, the solution data is read from or written to it.
+
+    Notes
+    -----
+    Except for K, the link-based formulation can change the parameters in place (see
+    `Formulation.update_parameters`). It is then constructed only once, for the least restrictive value (L_max can
+    only be lowered in place), and CPLEX keeps the previous solution as a MIP start. For K, a new formulation is
+    constructed for every value, which gets the previous solution as a warm start.
+
+    """
+    update_in_place = scan_param_name != "K"
+    solutions_data = []
+    prog = None
+    previous_solution = None
+    for value in values:
+        parameters_this_value = dict(parameters, **{scan_param_name: value})
+        if cache_dir is not None:
+            path = _solution_cache_path(cache_dir, graph_container, alpha, parameters_this_value)
+            if os.path.isfile(path):
+                with open(path, 'rb') as file:
+                    solutions_data.append(pickle.load(file))
+                continue
+        if prog is None:
+            construction_value = values[-1] if update_in_place else value
+            prog = LinkBasedFormulation(graph_container=graph_container, alpha=alpha,
+                                        **dict(parameters, **{scan_param_name: construction_value}))
+            if previous_solution is not None:
+                prog.add_warmstart(previous_solution)
+        if update_in_place:
+            prog.update_parameters(**{scan_param_name: value})
+        solution, _ = prog.solve()
+        if 'infeasible' in solution.get_status_string():
+            raise ValueError("Not all graphs allow for a solution of the repeater allocation problem for the"
+                             "specified parameters.")
+        solution_data = solution.get_solution_data()
+        if not update_in_place:
+            prog.clear()  # Clear the reference to the cplex object
+            prog = None
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(path, 'wb') as file:
+                pickle.dump(solution_data, file)
+        solutions_data.append(solution_data)
+        previous_solution = solution
+    if prog is not None:
+        prog.clear()
+    return solutions_data
+
+
+def _solution_cache_path(cache_dir, graph_container, alpha, parameters):
+    """Return the path under which the solution data of a graph is cached in `cache_dir`. It is determined by a hash
+    of the graph including its edge lengths, alpha and the parameters (as floats, since the scanned values are numpy
+    floats)."""
+    graph = graph_container.graph
+    key = (sorted(graph.nodes()), graph_container.end_nodes,
+           sorted((min(u, v), max(u, v), length) for u, v, length in graph.edges(data='length')),
+           float(alpha), sorted((name, float(value)) for name, value in parameters.items()))
+    return os.path.join(cache_dir, hashlib.sha1(repr(key).encode()).hexdigest() + '.pkl')
+
+
 if __name__ == "__main__":
 
     computation_time_vs_number_of_nodes(n_min=10, n_max=110, n_step=10, num_graphs=100, radius=0.9, L_max=1, N_max=6,
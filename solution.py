@@ -1,6 +1,6 @@
 import cplex
 import networkx as nx
-import matplotlib.pyplot as plt
+import numpy as np
 
 
 class Solution:
@@ -8,7 +8,9 @@ class Solution:
     def __init__(self, formulation):
         self.formulation = formulation
         self.parameters, self.overall_data = self._setup_solution()
-        self.feasible = "infeasible" not in self.get_status_string()
+        # Note that CPLEX can also stop without any solution, for instance when a time limit is reached
+        self.feasible = "infeasible" not in self.get_status_string() and \
+            self.formulation.cplex.solution.is_primal_feasible()
         if not self.feasible:
             return
         self.x_variables_chosen, self.repeater_nodes_chosen = self._interpret_variables()
@@ -42,29 +44,36 @@ class Solution:
         on which formulation is used"""
         x_variables_chosen = []
         repeater_nodes_chosen = []
-        for idx, val in enumerate(self.formulation.cplex.solution.get_values()):
-            if val > 1e-5:
-                var_name = self.formulation.cplex.variables.get_names(idx)
-                if var_name[0:2] == "y_":
-                    # This is a repeater node (y) variable
-                    repeater_nodes_chosen.append(var_name[2:])
+        # Only a small fraction of the variables is non-zero, so select these at once instead of looping over all
+        values = np.asarray(self.formulation.cplex.solution.get_values())
+        # Fetch all variable names in a single call instead of one call per non-zero variable
+        var_names = self.formulation.cplex.variables.get_names()
+        for idx in np.flatnonzero(values > 1e-5).tolist():
+            var_name = var_names[idx]
+            if var_name[0:2] == "y_":
+                # This is a repeater node (y) variable
+                repeater_nodes_chosen.append(var_name[2:])
+            else:
+                if self.formulation.read_from_file:
+                    pass
+                    # There is no access to varmap
+                    var_list = var_name.split("_")
+                    if len(var_list) != 4:
+                        print("Something has gone wrong with splitting {}, result: {}".format(var_name, var_list))
+                    pair_name = (var_list[1], var_list[2])
+                    st = var_list[3].split(",")
+                    s = st[0]
+                    t = st[1]
+                    (path_cost, path) = nx.single_source_dijkstra(G=self.formulation.graph_container.graph,
+                                                                  source=s, target=t, weight='length')
+                    path_tuple = (pair_name, path, path_cost)
+                elif "Path" in str(type(self.formulation)):
+                    # Only the repeater nodes of a path are stored in the variable map, so construct the full path
+                    q, r_up, path_cost = self.formulation.varmap[idx]
+                    path_tuple = (q, self.formulation.get_full_path(q, r_up), r_up, path_cost)
                 else:
-                    if self.formulation.read_from_file:
-                        pass
-                        # There is no access to varmap
-                        var_list = var_name.split("_")
-                        if len(var_list) != 4:
-                            print("Something has gone wrong with splitting {}, result: {}".format(var_name, var_list))
-                        pair_name = (var_list[1], var_list[2])
-                        st = var_list[3].split(",")
-                        s = st[0]
-                        t = st[1]
-                        (path_cost, path) = nx.single_source_dijkstra(G=self.formulation.graph_container.graph,
-                                                                      source=s, target=t, weight='length')
-                        path_tuple = (pair_name, path, path_cost)
-                    else:
-                        path_tuple = self.formulation.varmap[idx]
-                    x_variables_chosen.append(path_tuple)
+                    path_tuple = self.formulation.varmap[idx]
+                x_variables_chosen.append(path_tuple)
         # if len(repeater_nodes_chosen) > 0:
         #     print("{} Repeater(s) chosen: {}".format(len(repeater_nodes_chosen), repeater_nodes_chosen))
         self.overall_data['num_reps'] = len(repeater_nodes_chosen)
@@ -79,11 +88,15 @@ class Solution:
         path_data = {(q[0], q[1]): {} for q in self.formulation.graph_container.unique_end_node_pairs}
         repeater_node_degree = {u: 0 for u in self.repeater_nodes_chosen}
         total_cost, tot_num_el = 0, 0
+        # Group the chosen variables per source-destination pair once, instead of scanning all of them for every pair
+        x_variables_per_pair = {}
+        for tup in self.x_variables_chosen:
+            x_variables_per_pair.setdefault(tup[0], []).append(tup)
         for q in self.formulation.graph_container.unique_end_node_pairs:
             paths, repeater_nodes_used, num_el_used, cost_per_path = [], [], [], []
             if "Path" in str(type(self.formulation)):
                 # We are processing a solution of the path-based formulation
-                path_properties = [tup for tup in self.x_variables_chosen if tup[0] == q]
+                path_properties = x_variables_per_pair.get(q, [])
                 for k in range(self.formulation.K):
                     r_up = path_properties[k][2]
                     for u in r_up:
@@ -105,7 +118,12 @@ class Solution:
                 local_dict['path_cost'] = cost_per_path
             else:
                 # We are processing a link-based formulation, so apply the path-extraction algorithm
-                elementary_links_current_pair = [tup for tup in self.x_variables_chosen if tup[0] == q]
+                # Index the chosen elementary links by their starting node, such that every path can be extended in
+                # constant time instead of scanning all elementary links of this pair. Only the source can have more
+                # than one outgoing elementary link (one for each of the K node-disjoint paths).
+                elementary_links_by_start = {}
+                for edge in x_variables_per_pair.get(q, []):
+                    elementary_links_by_start.setdefault(edge[1][0], []).append(edge)
                 for _ in range(self.formulation.K):
                     path = [q[0]]  # Every path should start at s
                     old_len_rep_nodes = len(repeater_nodes_used)
@@ -113,17 +131,17 @@ class Solution:
                     num_el_current_path = 0
                     cost_current_path = 0
                     while path[-1] != q[1]:
-                        for edge in elementary_links_current_pair:
-                            if edge[1][0] == path[-1]:
-                                if edge[1][-1] != q[1]:
-                                    rep_nodes_current_path.append(edge[1][-1])
-                                    repeater_node_degree[edge[1][-1]] += 1
-                                path = path[0:-1]
-                                path.extend(edge[1])
-                                cost_current_path += edge[2]
-                                num_el_current_path += 1
-                                elementary_links_current_pair.remove(edge)
-                                break
+                        outgoing_links = elementary_links_by_start.get(path[-1])
+                        if not outgoing_links:
+                            raise ValueError("No elementary link leaving {} in the solution for pair {}."
+                                             .format(path[-1], q))
+                        edge = outgoing_links.pop(0)
+                        if edge[1][-1] != q[1]:
+                            rep_nodes_current_path.append(edge[1][-1])
+                            repeater_node_degree[edge[1][-1]] += 1
+                        path.extend(edge[1][1:])
+                        cost_current_path += edge[2]
+                        num_el_current_path += 1
                     num_el_used.append([num_el_current_path])
                     cost_per_path.append([cost_current_path])
                     total_cost += cost_current_path
@@ -132,17 +150,18 @@ class Solution:
                     if len(repeater_nodes_used) == old_len_rep_nodes:
                         repeater_nodes_used.append([])
                     paths.append(path)
-                if len(elementary_links_current_pair) > 0:
+                remaining_links = [edge[1] for edges in elementary_links_by_start.values() for edge in edges]
+                if len(remaining_links) > 0:
                     print("Solution contained a cyclic path for pair {}, which is excluded:"
                           .format(q))
-                    print([t[1] for t in elementary_links_current_pair])
+                    print(remaining_links)
                 local_dict = path_data[(q[0], q[1])]
                 local_dict['paths'] = paths
                 local_dict['num_el_used'] = num_el_used
                 local_dict['repeater_nodes_used'] = repeater_nodes_used
                 local_dict['path_cost'] = cost_per_path
 
-        used_elementary_links, used_edges, visited_nodes = [], [], set()
+        used_elementary_links, used_edges, visited_nodes = [], set(), set()
 
         for tup in self.x_variables_chosen:
             elementary_link_path = tup[1]
@@ -164,19 +183,16 @@ class Solution:
             else:
                 used_elementary_links.append((elementary_link_path[0], elementary_link_path[-1]))
             visited_nodes.update(elementary_link_path)
-            for i in range(len(elementary_link_path) - 1):
-                used_edges.append((elementary_link_path[i], elementary_link_path[i+1]))
+            used_edges.update(zip(elementary_link_path[:-1], elementary_link_path[1:]))
         self.visited_nodes = list(visited_nodes)
-        self.link_extension_nodes = list(set([i for i in visited_nodes if i not in self.repeater_nodes_chosen
-                                              and i not in self.formulation.graph_container.end_nodes]))
+        repeater_node_set = set(self.repeater_nodes_chosen)
+        self.link_extension_nodes = [i for i in visited_nodes if i not in repeater_node_set
+                                     and i not in self.formulation.graph_container.end_node_set]
         self.used_elementary_links = used_elementary_links
-        self.used_edges = list(set(used_edges))
-        self.unused_edges = list(self.formulation.graph_container.graph.edges())
-        for tup in self.used_edges:
-            if tup in self.unused_edges:
-                self.unused_edges.remove(tup)
-            elif tuple(reversed(tup)) in self.unused_edges:
-                self.unused_edges.remove(tuple(reversed(tup)))
+        self.used_edges = list(used_edges)
+        # An edge of the graph is unused if it is not traversed in either direction
+        self.unused_edges = [(u, v) for u, v in self.formulation.graph_container.graph.edges()
+                             if (u, v) not in used_edges and (v, u) not in used_edges]
 
         self.overall_data['tot_path_cost'] = round(total_cost, 3)
         self.overall_data['avg_path_len'] = round(total_cost / self.formulation.graph_container.num_unique_pairs)
@@ -186,10 +202,9 @@ class Solution:
 
     def _create_virtual_solution_graph(self):
         """Create a virtual graph based on the solution where the edges are elementary links."""
-        pos = nx.get_node_attributes(self.formulation.graph_container.graph, 'pos')
         self.virtual_solution_graph = nx.Graph()
         self.virtual_solution_graph.add_nodes_from(self.formulation.graph_container.end_nodes + self.repeater_nodes_chosen)
-        nx.set_node_attributes(self.virtual_solution_graph, pos, name='pos')
+        nx.set_node_attributes(self.virtual_solution_graph, self.formulation.graph_container.pos, name='pos')
         self.virtual_solution_graph.add_edges_from(self.used_elementary_links)
 
     def get_status_string(self):
@@ -221,6 +236,7 @@ class Solution:
                       self.path_data[q]['path_cost'][k]))
 
     def draw_virtual_solution_graph(self):
+        import matplotlib.pyplot as plt
         pos = nx.get_node_attributes(self.virtual_solution_graph, 'pos')
         # Create blank figure
         fig, ax = plt.subplots(figsize=(7, 7))
@@ -241,7 +257,7 @@ class Solution:
         # Finally draw the elementary links
         nx.draw_networkx_edges(G=self.virtual_solution_graph, pos=pos, edgelist=self.used_elementary_links, width=8)
         # Draw all the node labels
-        labels = {node: node if node in self.formulation.graph_container.end_nodes else ""
+        labels = {node: node if node in self.formulation.graph_container.end_node_set else ""
                   for node, nodedata in self.virtual_solution_graph.nodes.items()}
         nx.draw_networkx_labels(G=self.virtual_solution_graph, pos=pos, labels=labels, font_size=30,
                                 font_weight="bold", font_color="w", font_family='serif')
@@ -255,13 +271,10 @@ class Solution:
         plt.show()
 
     def draw_physical_solution_graph(self):
-        pos = nx.get_node_attributes(self.formulation.graph_container.graph, 'pos')
-        labels = {}
-        for node, nodedata in self.formulation.graph_container.graph.nodes.items():
-            if node in self.formulation.graph_container.end_nodes:
-                labels[node] = node
-            else:
-                labels[node] = ""
+        import matplotlib.pyplot as plt
+        pos = self.formulation.graph_container.pos
+        end_node_set = self.formulation.graph_container.end_node_set
+        labels = {node: node if node in end_node_set else "" for node in self.formulation.graph_container.graph}
         # Empty figure
         fig, ax = plt.subplots(figsize=(7, 7))
         # First draw end nodes
@@ -284,10 +297,9 @@ class Solution:
                                               label="Link Extension")
             le_nodes.set_edgecolor('k')
         # Also draw all the unused nodes
-        unused_nodes = []
-        [unused_nodes.append(n) for n in self.formulation.graph_container.graph.nodes() if
-         (n not in self.link_extension_nodes and n not in self.repeater_nodes_chosen
-          and n not in self.formulation.graph_container.end_nodes)]
+        used_nodes = set(self.link_extension_nodes).union(self.repeater_nodes_chosen,
+                                                          self.formulation.graph_container.end_node_set)
+        unused_nodes = [n for n in self.formulation.graph_container.graph.nodes() if n not in used_nodes]
         if unused_nodes:
             unu_nodes = nx.draw_networkx_nodes(G=self.formulation.graph_container.graph, pos=pos, node_size=1500,
                                                nodelist=unused_nodes, node_color=[[1, 1, 1]])
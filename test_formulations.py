@@ -0,0 +1,104 @@
+from formulations import LinkBasedFormulation, PathBasedFormulation
+from graph_tools import GraphContainer, create_graph_and_partition
+import pytest
+
+# A small graph, such that the formulations stay within the limits of the CPLEX Community Edition
+setup_params = {"num_nodes": 10,
+                "radius": 0.6,
+                "seed": 3}
+solve_params = {"alpha": 1 / 100,
+                "L_max": 0.7,
+                "N_max": 3,
+                "D": 4,
+                "K": 2}
+
+
+def create_graph_container():
+    return GraphContainer(create_graph_and_partition(**setup_params))
+
+
+def solve(formulation):
+    sol, _ = formulation.solve()
+    assert sol.feasible
+    return formulation.cplex.solution.get_objective_value()
+
+
+def test_path_generation_in_workers():
+    graph_container = create_graph_container()
+    serial = PathBasedFormulation(graph_container, **solve_params, num_workers=1)
+    parallel = PathBasedFormulation(graph_container, **solve_params, num_workers=2)
+    assert parallel.varmap == serial.varmap
+    assert parallel.direct_link_vars == serial.direct_link_vars
+    assert solve(parallel) == pytest.approx(solve(serial))
+
+
+@pytest.mark.parametrize("formulation_class", [LinkBasedFormulation, PathBasedFormulation])
+def test_cache_round_trip(tmp_path, monkeypatch, formulation_class):
+    graph_container = create_graph_container()
+    constructed = formulation_class(graph_container, **solve_params, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 2
+
+    def fail(self):
+        raise AssertionError("The formulation should be read from the cache.")
+    # The second formulation must not be constructed again
+    monkeypatch.setattr(formulation_class, '_add_variables', fail)
+    cached = formulation_class(graph_container, **solve_params, cache_dir=str(tmp_path))
+    assert cached.cplex.variables.get_num() == constructed.cplex.variables.get_num()
+    assert cached.varmap == constructed.varmap
+    assert solve(cached) == pytest.approx(solve(constructed))
+
+
+def test_cache_path_depends_on_parameters(tmp_path):
+    graph_container = create_graph_container()
+    PathBasedFormulation(graph_container, **solve_params, cache_dir=str(tmp_path))
+    PathBasedFormulation(graph_container, **dict(solve_params, D=3), cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob('*.sav'))) == 2
+
+
+@pytest.mark.parametrize("formulation_class", [LinkBasedFormulation, PathBasedFormulation])
+def test_stall_time(formulation_class):
+    graph_container = create_graph_container()
+    optimum = solve(formulation_class(graph_container, **solve_params))
+    # The solution found before stalling must be feasible, but not necessarily optimal
+    stalled = formulation_class(graph_container, **solve_params, stall_time=0.1)
+    assert solve(stalled) >= optimum - 1e-6
+    for stall_time in [0, -1., 'long']:
+        with pytest.raises(ValueError):
+            formulation_class(graph_container, **solve_params, stall_time=stall_time)
+
+
+@pytest.mark.parametrize("formulation_class, name, value", [(LinkBasedFormulation, 'alpha', 1 / 10),
+                                                            (LinkBasedFormulation, 'D', 5),
+                                                            (LinkBasedFormulation, 'N_max', 2),
+                                                            (LinkBasedFormulation, 'L_max', 0.6),
+                                                            (PathBasedFormulation, 'alpha', 1 / 10),
+                                                            (PathBasedFormulation, 'D', 5),
+                                                            (PathBasedFormulation, 'N_max', 2),
+                                                            (PathBasedFormulation, 'K', 1)])
+def test_update_parameters(formulation_class, name, value):
+    graph_container = create_graph_container()
+    new_params = dict(solve_params, **{name: value})
+    formulation = formulation_class(graph_container, **solve_params)
+    solve(formulation)
+    formulation.update_parameters(**{name: value})
+    assert getattr(formulation, name) == value
+    assert solve(formulation) == pytest.approx(solve(formulation_class(graph_container, **new_params)))
+    # Changing the parameter back should give the original optimum again
+    formulation.update_parameters(**{name: solve_params[name]})
+    assert solve(formulation) == pytest.approx(solve(formulation_class(graph_container, **solve_params)))
+
+
+@pytest.mark.parametrize("formulation_class, params, update", [
+    (LinkBasedFormulation, solve_params, {'L_max': 0.8}),
+    (LinkBasedFormulation, solve_params, {'K': 1}),
+    (PathBasedFormulation, dict(solve_params, N_max=2), {'N_max': 3}),
+    (PathBasedFormulation, dict(solve_params, K=1), {'K': 2}),
+    (PathBasedFormulation, solve_params, {'L_max': 0.6})])
+def test_update_parameters_beyond_construction(formulation_class, params, update):
+    graph_container = create_graph_container()
+    formulation = formulation_class(graph_container, **params)
+    with pytest.raises(ValueError):
+        formulation.update_parameters(**update)
+    # Nothing should have been changed
+    for name, value in params.items():
+        assert getattr(formulation, name) == value
@@ -1,5 +1,7 @@
-from random_graph_scan import generate_feasible_graph, generate_feasible_graphs, solve_graphs
+from random_graph_scan import RandomGraphScan, generate_feasible_graph, generate_feasible_graphs, solve_graphs
+from copy import deepcopy
 import numpy as np
+import random
 
 setup_params = {"num_nodes": 30,
                 "radius": np.sqrt(2)}
@@ -8,6 +10,25 @@ solve_params = {"alpha": 0,
                 "N_max": 100,
                 "D": 1000,
                 "K": 1}
+# A small scan, such that the formulations stay within the limits of the CPLEX Community Edition
+scan_params = {"scan_param_name": "L_max",
+               "scan_param_min": 0.6,
+               "scan_param_max": 1.0,
+               "scan_param_step": 0.2,
+               "num_graphs": 3,
+               "num_nodes": 10,
+               "radius": 0.8,
+               "alpha": 1 / 100,
+               "L_max": 0.8,
+               "N_max": 3,
+               "D": 10,
+               "K": 1}
+
+
+def create_random_graph_scan():
+    random.seed(1)
+    np.random.seed(1)
+    return RandomGraphScan(**scan_params)
 
 
 def test_feasible_graph():
@@ -29,3 +50,26 @@ def test_solve_graphs():
     assert len(new_solutions) == len(solutions)
     for sol, new_sol in zip(solutions, new_solutions):
         assert sol.get_solution_data() == new_sol.get_solution_data()
+
+
+def test_random_graph_scan_in_workers():
+    random_graph_scan = create_random_graph_scan()
+    parallel_random_graph_scan = deepcopy(random_graph_scan)
+    random_graph_scan.solve()
+    parallel_random_graph_scan.solve(num_workers=2)
+    assert parallel_random_graph_scan.solutions_data == random_graph_scan.solutions_data
+
+
+def test_random_graph_scan_cache(tmp_path, monkeypatch):
+    random_graph_scan = create_random_graph_scan()
+    cached_random_graph_scan = deepcopy(random_graph_scan)
+    random_graph_scan.solve(cache_dir=str(tmp_path))
+    # Every graph is solved for the values other than the most restrictive one, which was solved while generating it
+    assert len(list(tmp_path.iterdir())) == scan_params["num_graphs"] * (len(random_graph_scan.range) - 1)
+
+    def fail(**kwargs):
+        raise AssertionError("The solution data should be read from the cache.")
+    # The second scan must not solve any graph again
+    monkeypatch.setattr('random_graph_scan.LinkBasedFormulation', fail)
+    cached_random_graph_scan.solve(cache_dir=str(tmp_path))
+    assert cached_random_graph_scan.solutions_data == random_graph_scan.solutions_data